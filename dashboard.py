@@ -1,32 +1,322 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import streamlit as st
 import plotly.graph_objects as go
 
 
-def _get_funnel_sessions(df: pd.DataFrame):
-    """Return session data for each funnel stage."""
-    sessions_with_product_view = set(
-        df[df["path"].str.startswith("/products", na=False)]["session_id"].astype(str)
-    )
-    sessions_with_add_to_cart = set(
-        df[df["css"] == "button.add-to-cart"]["session_id"].astype(str)
-    )
-    sessions_with_view_cart = set(
-        df[(df["path"] == "/cart") & (df["css"] == "button.checkout")]["session_id"].astype(str)
+@st.cache_resource(show_spinner="Loading…")
+def _load_df(path: str, lines_json: bool, mtime: float) -> pd.DataFrame:
+    """Load the sessions file, cached on (path, lines_json, mtime).
+
+    mtime is part of the key so edits to the file invalidate the cache;
+    otherwise every rerun would re-parse the JSON from scratch. The frame
+    is a shared singleton (cache_resource: no per-rerun pickle copy), so
+    callers must treat it as read-only.
+    """
+    return _load_sessions_frame(path, lines_json)
+
+
+def _load_sessions_frame(path: str, lines_json: bool = True) -> pd.DataFrame:
+    """Load a sessions file with the Parquet side-car and dtype shrink.
+
+    Plain function (no Streamlit caching) so the CLI scripts can share it.
+    """
+    pq_path = path + ".parquet"
+    if os.path.exists(pq_path) and os.path.getmtime(pq_path) >= os.path.getmtime(path):
+        # The side-car only ever contains (present) _USED_COLS, so read it
+        # whole; a hard-coded columns= would fail for files that lack some
+        df = pd.read_parquet(pq_path)
+        return _shrink_dtypes(df[[c for c in _USED_COLS if c in df.columns]])
+
+    df = _read_json_lines(path) if lines_json else pd.read_json(path)
+    df = df[[c for c in _USED_COLS if c in df.columns]]
+    df = _shrink_dtypes(df)
+    try:
+        # Side-car for the next cold start: columnar, compressed, and far
+        # faster to read back than re-parsing the JSON
+        df.to_parquet(pq_path, compression="zstd")
+    except (ImportError, OSError):
+        pass
+    return df
+
+
+def _read_json_lines(path: str) -> pd.DataFrame:
+    """Parse a JSON Lines file with the fastest parser available.
+
+    Prefers pyarrow's multithreaded C++ reader, then orjson line-by-line,
+    then pandas' built-in parser.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.json as paj
+    except ImportError:
+        pass
+    else:
+        try:
+            # Stream record batches so peak memory is bounded by block_size
+            # rather than the file size; unused fields are dropped per batch
+            read_options = paj.ReadOptions(use_threads=True, block_size=8 << 20)
+            with paj.open_json(path, read_options=read_options) as reader:
+                batches = [
+                    batch.select([c for c in _USED_COLS if c in batch.schema.names])
+                    for batch in reader
+                ]
+            table = pa.Table.from_batches(batches)
+        except AttributeError:
+            # Older pyarrow without open_json: one monolithic (but still
+            # multithreaded C++) read
+            table = paj.read_json(path, read_options=paj.ReadOptions(block_size=64 << 20))
+        # Zero-copy where possible: Arrow-backed dtypes, one block per
+        # column, and the Arrow buffers released as they are converted
+        return table.to_pandas(types_mapper=pd.ArrowDtype, split_blocks=True, self_destruct=True)
+    try:
+        import orjson
+
+        with open(path, "rb") as f:
+            return pd.DataFrame.from_records(orjson.loads(line) for line in f)
+    except ImportError:
+        return pd.read_json(path, lines=True)
+
+
+def _shrink_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Downcast columns to cheaper dtypes right after load.
+
+    Low-cardinality strings become categoricals (integer-code compares),
+    free text moves to Arrow-backed strings, timestamps become real
+    datetimes and integers are downcast — every later mask scan pays
+    proportionally less memory bandwidth.
+    """
+    for column in ("session_id", "path", "css"):
+        if column in df.columns:
+            # pyarrow infers a `null` type for all-null columns, and
+            # categorical categories cannot be null — go through string so
+            # the cast yields an empty-category categorical (all codes -1)
+            if df[column].isna().all():
+                df[column] = df[column].astype("string")
+            df[column] = df[column].astype("category")
+    if "text" in df.columns:
+        df["text"] = df["text"].astype("string[pyarrow]")
+    if "event_time" in df.columns:
+        df["event_time"] = pd.to_datetime(df["event_time"], errors="coerce")
+    for column in df.select_dtypes("integer").columns:
+        df[column] = pd.to_numeric(df[column], downcast="unsigned")
+    return df
+
+
+def _category_code(categories: pd.Index, value) -> int:
+    """Code of value in a categorical's categories, or -2 if absent.
+
+    -2 never matches any row: real codes are >= 0 and missing values are -1.
+    """
+    loc = categories.get_indexer([value])[0]
+    return loc if loc >= 0 else -2
+
+
+def _compute_event_masks(df: pd.DataFrame) -> dict:
+    """Per-event boolean masks for the funnel predicates.
+
+    String work happens only on the (tiny) category arrays; the per-row
+    masks are then integer compares and a single boolean gather over the
+    code arrays — one memory sweep per mask instead of a string scan.
+    """
+    path = df["path"].cat
+    css = df["css"].cat
+    path_codes = path.codes.to_numpy()
+    css_codes = css.codes.to_numpy()
+
+    # Prefix test per category, then gathered through the codes; the
+    # appended False entry is what the -1 (missing) code lands on.
+    product_by_category = np.array(
+        [str(c).startswith("/products") for c in path.categories] + [False]
     )
-    sessions_with_checkout = set(
-        df[df["path"] == "/checkout"]["session_id"].astype(str)
+
+    return {
+        "is_product": product_by_category[path_codes],
+        "is_cart": path_codes == _category_code(path.categories, "/cart"),
+        "is_checkout": path_codes == _category_code(path.categories, "/checkout"),
+        "add_to_cart": css_codes == _category_code(css.categories, "button.add-to-cart"),
+        "checkout_btn": css_codes == _category_code(css.categories, "button.checkout"),
+        "place_order": css_codes == _category_code(css.categories, "button.place-order"),
+    }
+
+
+@st.cache_resource(show_spinner=False, hash_funcs={pd.DataFrame: lambda _: None})
+def _compute_event_masks_cached(df_key: tuple, df: pd.DataFrame) -> dict:
+    """Cached wrapper around _compute_event_masks, keyed on df_key only.
+
+    Shared read-only singleton, like the frame itself.
+    """
+    return _compute_event_masks(df)
+
+
+_FUNNEL_STAGES = ("viewed", "added", "cart", "checkout", "placed")
+
+# The only columns the app ever touches; everything else is dropped at IO time
+_USED_COLS = ["session_id", "user_id", "path", "css", "text", "value", "event_time"]
+
+# Columns shown in the per-session event tables
+_DETAIL_COLS = ["path", "css", "text", "value", "event_time"]
+
+# Styling: make the selector feel clickable and on-brand (blue), pointer cursor on hover
+_SELECT_CSS = """
+<style>
+/* Pointer cursor for the select control */
+div[data-baseweb="select"] > div { cursor: pointer; }
+/* Hover/focus ring in brand blue */
+div[data-baseweb="select"] > div:hover { border-color: #636efa !important; }
+div[data-baseweb="select"] > div:focus, div[data-baseweb="select"] > div:focus-within {
+    box-shadow: 0 0 0 2px rgba(99,110,250,0.3) !important;
+    border-color: #636efa !important;
+}
+/* Selected option and hover inside dropdown */
+ul[role="listbox"] li[aria-selected="true"] { background-color: rgba(99,110,250,0.12) !important; color: #1f1f1f !important; }
+ul[role="listbox"] li:hover { background-color: rgba(99,110,250,0.18) !important; cursor: pointer; }
+</style>
+"""
+
+_FUNNEL_SQL = """
+SELECT session_id,
+  coalesce(bool_or(path LIKE '/products%'), FALSE)                          AS viewed,
+  coalesce(bool_or(css = 'button.add-to-cart'), FALSE)                      AS added,
+  coalesce(bool_or(path = '/cart' AND css = 'button.checkout'), FALSE)      AS cart,
+  coalesce(bool_or(path = '/checkout'), FALSE)                              AS checkout,
+  coalesce(bool_or(path = '/checkout' AND css = 'button.place-order'), FALSE) AS placed
+FROM events
+GROUP BY session_id
+"""
+
+
+def _get_funnel_sessions_duckdb(df: pd.DataFrame):
+    """Funnel stage membership via a single DuckDB GROUP BY.
+
+    DuckDB's vectorized, multi-threaded engine handles the mixed
+    filter+aggregation in one pass over the frame; the result is converted
+    back to the session bitmaps the rest of the app expects.
+    """
+    import duckdb
+
+    con = duckdb.connect()
+    con.register("events", df)
+    per_session = con.execute(_FUNNEL_SQL).df()
+    con.close()
+
+    # Each stage requires all prior ones: cumulative AND across columns
+    cumulative = per_session[list(_FUNNEL_STAGES)].to_numpy().cumprod(axis=1).astype(bool)
+    codes = df["session_id"].cat.categories.get_indexer(per_session["session_id"])
+    n_sessions = len(df["session_id"].cat.categories)
+
+    stages = {}
+    for i, stage in enumerate(_FUNNEL_STAGES):
+        bitmap = np.zeros(n_sessions, dtype=bool)
+        selected = codes[cumulative[:, i]]
+        bitmap[selected[selected >= 0]] = True
+        stages[stage] = bitmap
+    return stages
+
+
+_numba_funnel_kernel = None
+
+
+def _get_funnel_sessions_numba(df: pd.DataFrame, masks: dict):
+    """Funnel stage membership via a Numba-JITed parallel reduction.
+
+    A single prange pass over the event rows fills a (n_sessions, 5) hit
+    matrix; the stage ordering is then a cumulative AND across columns.
+    The concurrent hit[s, j] = 1 writes are idempotent, so the race across
+    threads is benign.
+    """
+    global _numba_funnel_kernel
+    if _numba_funnel_kernel is None:
+        from numba import njit, prange
+
+        @njit(parallel=True)
+        def kernel(codes, stage_flags, n_sessions):
+            hit = np.zeros((n_sessions, 5), np.uint8)
+            for i in prange(codes.shape[0]):
+                s = codes[i]
+                if s < 0:
+                    continue
+                for j in range(5):
+                    if stage_flags[i, j]:
+                        hit[s, j] = 1
+            return hit
+
+        _numba_funnel_kernel = kernel
+
+    codes = df["session_id"].cat.codes.to_numpy()
+    stage_flags = np.column_stack(
+        (
+            masks["is_product"],
+            masks["add_to_cart"],
+            masks["is_cart"] & masks["checkout_btn"],
+            masks["is_checkout"],
+            masks["is_checkout"] & masks["place_order"],
+        )
     )
-    sessions_with_order_placed = set(
-        df[(df["path"] == "/checkout") & (df["css"] == "button.place-order")]["session_id"].astype(str)
+    hit = _numba_funnel_kernel(codes, stage_flags, len(df["session_id"].cat.categories))
+    cumulative = hit.cumprod(axis=1).astype(bool)
+    return {
+        stage: cumulative[:, i]
+        for i, stage in enumerate(_FUNNEL_STAGES)
+    }
+
+
+def _session_bitmap(df: pd.DataFrame, mask) -> np.ndarray:
+    """Bitmap over session_id category codes of sessions with any row in mask."""
+    codes = df["session_id"].cat.codes.to_numpy()
+    bitmap = np.zeros(len(df["session_id"].cat.categories), dtype=bool)
+    selected = codes[mask]
+    # code -1 marks rows with a missing session_id
+    bitmap[selected[selected >= 0]] = True
+    return bitmap
+
+
+def _get_funnel_sessions(df: pd.DataFrame, masks: dict | None = None):
+    """Return a session bitmap for each funnel stage.
+
+    Stage membership is a boolean array over the session_id category codes
+    (one bit per session), so stage intersections are SIMD bitwise ANDs,
+    counts are .sum() and drop-offs are flatnonzero(a & ~b). Prefers
+    DuckDB, then a Numba kernel, when installed. Bitmap positions map back
+    to ids at the UI boundary via _session_ids_for_codes.
+    """
+    try:
+        return _get_funnel_sessions_duckdb(df)
+    except ImportError:
+        pass
+    except Exception:
+        # DuckDB is an accelerator, not a requirement: a runtime failure in
+        # this rung should fall through to the slower ones, not crash the app
+        pass
+    if masks is None:
+        masks = _compute_event_masks(df)
+    try:
+        return _get_funnel_sessions_numba(df, masks)
+    except ImportError:
+        pass
+    # The five per-stage scans are independent and NumPy releases the GIL,
+    # so run them in parallel; the bitwise ANDs stay sequential (cheap).
+    stage_masks = (
+        masks["is_product"],
+        masks["add_to_cart"],
+        masks["is_cart"] & masks["checkout_btn"],
+        masks["is_checkout"],
+        masks["is_checkout"] & masks["place_order"],
     )
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        base_viewed, base_added, base_cart, base_checkout, base_placed = executor.map(
+            lambda mask: _session_bitmap(df, mask), stage_masks
+        )
 
-    viewed = sessions_with_product_view
-    added = viewed & sessions_with_add_to_cart
-    cart = added & sessions_with_view_cart
-    checkout = cart & sessions_with_checkout
-    placed = checkout & sessions_with_order_placed
+    viewed = base_viewed
+    added = viewed & base_added
+    cart = added & base_cart
+    checkout = cart & base_checkout
+    placed = checkout & base_placed
 
     return {
         "viewed": viewed,
@@ -37,13 +327,34 @@ def _get_funnel_sessions(df: pd.DataFrame):
     }
 
 
-def _compute_funnel_fig(df: pd.DataFrame):
-    """Return a Plotly funnel figure computed from the dataframe.
+def _session_ids_for_codes(df: pd.DataFrame, codes) -> pd.Index:
+    """Map session_id category codes back to the original ids.
 
-    This mirrors the logic inside generate_cart_funnel but returns the fig for Streamlit.
+    Categories are lexicographically sorted, so sorted codes map to sorted ids.
+    """
+    return df["session_id"].cat.categories.take(codes)
+
+
+@st.cache_resource(show_spinner=False, hash_funcs={pd.DataFrame: lambda _: None})
+def _get_funnel_sessions_cached(df_key: tuple, df: pd.DataFrame):
+    """Cached wrapper around _get_funnel_sessions.
+
+    The dataframe itself is excluded from the cache key (hashing it is as
+    expensive as recomputing); df_key identifies the loaded file instead, so
+    reruns triggered by widget clicks reuse the precomputed bitmaps.
+    cache_resource hands back the same (read-only) dict every rerun instead
+    of re-pickling a fresh copy per hit.
+    """
+    return _get_funnel_sessions(df, _compute_event_masks_cached(df_key, df))
+
+
+@st.cache_resource(show_spinner=False)
+def _funnel_fig_from_counts(counts: tuple[int, ...]):
+    """Build the Plotly funnel figure from the five stage counts.
+
+    The figure only depends on these integers, so memoize on them directly;
+    cache_resource skips pickling the (heavy) Figure object.
     """
-    sessions = _get_funnel_sessions(df)
-    
     funnel_df = pd.DataFrame(
         {
             "stage": [
@@ -53,13 +364,7 @@ def _compute_funnel_fig(df: pd.DataFrame):
                 "Checkout Started",
                 "Order Placed",
             ],
-            "count": [
-                len(sessions["viewed"]),
-                len(sessions["added"]),
-                len(sessions["cart"]),
-                len(sessions["checkout"]),
-                len(sessions["placed"]),
-            ],
+            "count": list(counts),
         }
     )
 
@@ -71,16 +376,53 @@ def _compute_funnel_fig(df: pd.DataFrame):
         hovertemplate=None,
         hoverinfo="skip"
     )
-    
+
     return fig
 
 
-def _display_stage_details(df: pd.DataFrame, stage_name: str, sessions_in_stage: set, sessions_moved_next: set):
+@st.cache_resource(show_spinner=False, hash_funcs={pd.DataFrame: lambda _: None})
+def _session_index(df_key: tuple, df: pd.DataFrame) -> dict:
+    """Map each session_id to its row positions for O(1) per-session slicing.
+
+    Built once per loaded file as a shared singleton (cache_resource skips
+    pickling the dict of index arrays on every hit); the pagination buttons
+    then gather a handful of rows with df.take instead of scanning the full
+    session_id column.
+    """
+    return df.groupby("session_id", sort=False, observed=True).indices
+
+
+def _detail_table(session_events: pd.DataFrame):
+    """Detail-view slice as an Arrow table.
+
+    st.dataframe serializes Arrow directly, skipping the pandas
+    conversion/Styler path it runs for object-dtype frames.
+    """
+    import pyarrow as pa
+
+    return pa.Table.from_pandas(session_events[_DETAIL_COLS], preserve_index=False)
+
+
+def _ordered_sessions(key_base: str, source_key: tuple, make_ordered) -> tuple:
+    """Ordered tuple of session ids, recomputed only when source_key changes.
+
+    source_key is a hashable tuple compared by equality in session_state, so
+    pagination clicks reuse the previous ordering instead of rebuilding it on
+    every rerun; make_ordered is only called on a miss.
+    """
+    ordered_key = f"{key_base}_ordered"
+    if st.session_state.get(f"{key_base}_src") != source_key:
+        st.session_state[ordered_key] = tuple(make_ordered())
+        st.session_state[f"{key_base}_src"] = source_key
+    return st.session_state[ordered_key]
+
+
+def _display_stage_details(df: pd.DataFrame, df_key: tuple, stage_name: str, sessions_in_stage, sessions_moved_next, session_index: dict):
     """Display detailed information for a funnel stage."""
-    total = len(sessions_in_stage)
-    moved_next = len(sessions_moved_next)
+    total = int(sessions_in_stage.sum())
+    moved_next = int(sessions_moved_next.sum())
     dropped = total - moved_next
-    
+
     col1, col2, col3 = st.columns(3)
     with col1:
         st.metric("Total sessions at this step", total)
@@ -88,16 +430,20 @@ def _display_stage_details(df: pd.DataFrame, stage_name: str, sessions_in_stage:
         st.metric("Moved forward", moved_next)
     with col3:
         st.metric("Dropped here", dropped)
-    
-    if dropped > 0:
-        dropped_sessions = sessions_in_stage - sessions_moved_next
 
+    if dropped > 0:
         key_base = f"peek_{stage_name.replace(' ', '_').lower()}"
         index_key = f"{key_base}_idx"
         if index_key not in st.session_state:
             st.session_state[index_key] = 0
 
-        ordered_sessions = sorted(list(dropped_sessions))
+        ordered_sessions = _ordered_sessions(
+            key_base,
+            (df_key, stage_name),
+            lambda: _session_ids_for_codes(
+                df, np.flatnonzero(sessions_in_stage & ~sessions_moved_next)
+            ),
+        )
         total_sessions = len(ordered_sessions)
         if total_sessions == 0:
             st.info("No dropped sessions to show.")
@@ -116,13 +462,15 @@ def _display_stage_details(df: pd.DataFrame, stage_name: str, sessions_in_stage:
             with nav_cols[1]:
                 st.markdown(f"**Session {current_idx + 1} of {total_sessions}** — `{current_session_id}`")
 
-            session_events = df[df["session_id"].astype(str) == current_session_id]
+            session_events = df.take(session_index[current_session_id][:50])
             st.dataframe(
-                session_events[["path", "css", "text", "value", "event_time"]].head(50),
+                _detail_table(session_events),
+                height=400,
+                width="stretch",
             )
 
 
-def _handle_stage_selection(df: pd.DataFrame, stage_name: str, sessions: dict):
+def _handle_stage_selection(df: pd.DataFrame, df_key: tuple, stage_name: str, sessions: dict, session_index: dict):
     """Handle stage selection and display details."""
     # Map stage names to session sets
     stage_mapping = {
@@ -130,15 +478,131 @@ def _handle_stage_selection(df: pd.DataFrame, stage_name: str, sessions: dict):
         "Added to Cart": ("added", "cart"),
         "Viewed Cart": ("cart", "checkout"),
         "Checkout Started": ("checkout", "placed"),
-        "Order Placed": ("placed", set())  # No next stage
+        "Order Placed": ("placed", None)  # No next stage
     }
-    
+
     if stage_name in stage_mapping:
         current_stage, next_stage = stage_mapping[stage_name]
         sessions_in_stage = sessions[current_stage]
-        sessions_moved_next = sessions[next_stage] if next_stage else set()
-        
-        _display_stage_details(df, stage_name, sessions_in_stage, sessions_moved_next)
+        sessions_moved_next = sessions[next_stage] if next_stage else np.zeros_like(sessions_in_stage)
+
+        _display_stage_details(df, df_key, stage_name, sessions_in_stage, sessions_moved_next, session_index)
+
+
+@st.cache_resource(show_spinner=False)
+def _pie_fig(rows: tuple):
+    """Insights pie figure from (reason, count) pairs (cached singleton)."""
+    agg_df = pd.DataFrame(rows, columns=["reason", "count"])
+    fig = px.pie(agg_df, values="count", names="reason", title="What stopped shoppers from completing checkout")
+    fig.update_traces(textfont_color="black")
+    return fig
+
+
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: lambda _: None})
+def _loss_reasons_cached(df_key: tuple, df: pd.DataFrame) -> pd.DataFrame:
+    """Loss reason per non-converting session, computed once per loaded file.
+
+    Reason classifier per spec, as one vectorized pass:
+    - Has error if ANY css contains 'div.error-message'
+    - Error uniqueness = combination of path and error message -> "/path - Error message"
+    Takes each session's first error (by event_time), then defaults the
+    remaining non-converting sessions to "No error".
+    """
+    sessions = _get_funnel_sessions_cached(df_key, df)
+    # The cohort excludes every session that placed an order, not just the
+    # ones that placed it via the full funnel: sessions["placed"] is the
+    # cumulative stage, so build the raw placed bitmap from the event masks.
+    masks = _compute_event_masks_cached(df_key, df)
+    placed = _session_bitmap(df, masks["is_checkout"] & masks["place_order"])
+    viewed_not_placed = _session_ids_for_codes(
+        df, np.flatnonzero(sessions["viewed"] & ~placed)
+    )
+
+    err_mask = df["css"].str.contains("div.error-message", na=False, regex=False)
+    err = df.loc[err_mask, ["session_id", "path", "text", "event_time"]].sort_values("event_time")
+    # Keep the whole first row per session: groupby().first() would take the
+    # first non-NA value per column, pairing fields from different events.
+    first_err = err.drop_duplicates("session_id", keep="first").set_index("session_id")
+    error_path = first_err["path"].astype("string[pyarrow]")
+    error_path = error_path.where(error_path.notna() & (error_path != ""), "/")
+    error_message = first_err["text"].astype("string[pyarrow]")
+    error_message = error_message.where(error_message.notna() & (error_message != ""), "Error")
+    reason_by_session = error_path.str.cat(error_message, sep=" - ")
+
+    reasons = pd.Series("No error", index=pd.Index(viewed_not_placed, name="session_id"))
+    reasons.update(reason_by_session)
+    return reasons.rename("reason").reset_index()
+
+
+@st.fragment
+def _render_insights(df: pd.DataFrame, df_key: tuple, session_index: dict):
+    """Render the customer-insights tab.
+
+    Runs as a fragment so its own widgets (reason selectbox, pagination
+    buttons) rerun only this section instead of the whole script; the
+    classification itself comes out of the cache.
+    """
+    st.subheader("Why shoppers didn't complete their order")
+
+    reasons_df = _loss_reasons_cached(df_key, df)
+
+    if not reasons_df.empty:
+        agg_df = reasons_df.groupby("reason", as_index=False).size().rename(columns={"size": "count"})
+
+        # Hoverable pie chart, memoized on its (reason, count) inputs
+        fig = _pie_fig(tuple(map(tuple, agg_df.itertuples(index=False))))
+        st.plotly_chart(fig, width="stretch", theme=None)
+
+        # Selectable menu to explore a reason (including "No error") like in details page
+        all_reasons_sorted = agg_df.sort_values("count", ascending=False)
+        st.subheader("Explore a specific reason")
+        if not all_reasons_sorted.empty:
+            error_options = all_reasons_sorted["reason"].tolist()
+            chosen_error = st.selectbox("Which reason do you want to inspect?", error_options, key="insights_error_select")
+            if chosen_error:
+                st.divider()
+                # Sessions that match this error
+                matching_sessions = set(reasons_df[reasons_df["reason"] == chosen_error]["session_id"])
+                total_matching = len(matching_sessions)
+                st.metric("Sessions with this reason", total_matching)
+
+                if total_matching > 0:
+                    # Always show navigation and a single events table by default
+                    key_base = f"insights_{chosen_error.replace(' ', '_').lower()}"
+                    index_key = f"{key_base}_idx"
+                    if index_key not in st.session_state:
+                        st.session_state[index_key] = 0
+
+                    ordered_sessions = _ordered_sessions(
+                        key_base, (df_key, chosen_error), lambda: sorted(matching_sessions)
+                    )
+                    total_sessions = len(ordered_sessions)
+                    if total_sessions == 0:
+                        st.info("No sessions to show.")
+                    else:
+                        nav_cols = st.columns([1, 4, 1])
+                        with nav_cols[0]:
+                            if st.button("←", key=f"prev_{key_base}"):
+                                st.session_state[index_key] = (st.session_state[index_key] - 1) % total_sessions
+                        with nav_cols[2]:
+                            if st.button("→", key=f"next_{key_base}"):
+                                st.session_state[index_key] = (st.session_state[index_key] + 1) % total_sessions
+
+                        current_idx = st.session_state[index_key] % total_sessions
+                        current_session_id = ordered_sessions[current_idx]
+                        with nav_cols[1]:
+                            st.markdown(f"**Session {current_idx + 1} of {total_sessions}** — `{current_session_id}`")
+
+                        session_events = df.take(session_index[current_session_id][:50])
+                        st.dataframe(
+                            _detail_table(session_events),
+                            height=400,
+                            width="stretch",
+                        )
+        else:
+            st.write("No errors detected among non-converting sessions.")
+    else:
+        st.info("No non-converting sessions found from product views.")
 
 
 def main():
@@ -146,25 +610,7 @@ def main():
     st.title("User journey dashboard")
     st.caption("A quick read on where shoppers move forward and where they drop out.")
 
-    # Styling: make the selector feel clickable and on-brand (blue), pointer cursor on hover
-    st.markdown(
-        """
-        <style>
-        /* Pointer cursor for the select control */
-        div[data-baseweb="select"] > div { cursor: pointer; }
-        /* Hover/focus ring in brand blue */
-        div[data-baseweb="select"] > div:hover { border-color: #636efa !important; }
-        div[data-baseweb="select"] > div:focus, div[data-baseweb="select"] > div:focus-within {
-            box-shadow: 0 0 0 2px rgba(99,110,250,0.3) !important;
-            border-color: #636efa !important;
-        }
-        /* Selected option and hover inside dropdown */
-        ul[role="listbox"] li[aria-selected="true"] { background-color: rgba(99,110,250,0.12) !important; color: #1f1f1f !important; }
-        ul[role="listbox"] li:hover { background-color: rgba(99,110,250,0.18) !important; cursor: pointer; }
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
+    st.markdown(_SELECT_CSS, unsafe_allow_html=True)
 
     # Sidebar controls
     st.sidebar.header("Controls")
@@ -173,10 +619,8 @@ def main():
 
     # Load data
     try:
-        if lines_json:
-            df = pd.read_json(data_file, lines=True)
-        else:
-            df = pd.read_json(data_file)
+        mtime = os.path.getmtime(data_file)
+        df = _load_df(data_file, lines_json, mtime)
     except Exception as e:
         st.error(f"Failed to load data from '{data_file}': {e}")
         return
@@ -184,14 +628,18 @@ def main():
     # Pages (tabs) for top-level navigation
     tabs = st.tabs(["User funnel", "Step details", "Customer insights"])
 
-    # Precompute sessions once
-    sessions = _get_funnel_sessions(df)
+    # Precompute sessions once; keyed on the file identity so widget-driven
+    # reruns hit the cache instead of rescanning the dataframe
+    df_key = (data_file, mtime)
+    sessions = _get_funnel_sessions_cached(df_key, df)
+    session_index = _session_index(df_key, df)
 
     # Page 1: Funnel
     with tabs[0]:
         st.subheader("How many users move through each step?")
-        funnel_fig = _compute_funnel_fig(df)
-        st.plotly_chart(funnel_fig)
+        counts = tuple(int(sessions[stage].sum()) for stage in _FUNNEL_STAGES)
+        funnel_fig = _funnel_fig_from_counts(counts)
+        st.plotly_chart(funnel_fig, width="stretch", theme=None)
 
     # Page 2: Step details
     with tabs[1]:
@@ -205,112 +653,11 @@ def main():
         selected_stage = st.selectbox("Which step do you want to inspect?", stage_options)
         if selected_stage:
             st.divider()
-            _handle_stage_selection(df, selected_stage, sessions)
+            _handle_stage_selection(df, df_key, selected_stage, sessions, session_index)
 
     # Page 3: Customer insights
     with tabs[2]:
-        st.subheader("Why shoppers didn't complete their order")
-
-        # Cohorts
-        sessions_with_product_view = set(
-            df[df["path"].str.startswith("/products", na=False)]["session_id"].astype(str)
-        )
-        sessions_with_order_placed = set(
-            df[(df["path"] == "/checkout") & (df["css"] == "button.place-order")]["session_id"].astype(str)
-        )
-        viewed_not_placed = sessions_with_product_view - sessions_with_order_placed
-
-        # Reason classifier per spec:
-        # - Has error if ANY css contains 'div.error-message'
-        # - Error uniqueness = combination of path and error message -> "/path - Error message"
-        def classify_loss_reason(session_df: pd.DataFrame) -> str:
-            # Ensure string dtype for checks
-            session_df = session_df.copy()
-            session_df["css"] = session_df["css"].astype(str)
-            session_df["path"] = session_df["path"].astype(str)
-            session_df["text"] = session_df["text"].astype(str)
-
-            # Filter rows that display an error message
-            error_rows = session_df[session_df["css"].str.contains("div.error-message", na=False)]
-
-            if error_rows.empty:
-                return "No error"
-
-            # Use first occurrence (ordered by event_time if present)
-            if "event_time" in error_rows.columns:
-                try:
-                    ordered = error_rows.sort_values("event_time")
-                except Exception:
-                    ordered = error_rows
-            else:
-                ordered = error_rows
-
-            first = ordered.iloc[0]
-            path = first.get("path", "/") or "/"
-            message = first.get("text", "Error") or "Error"
-            return f"{path} - {message}"
-
-        records: list[dict] = []
-        for session_id in viewed_not_placed:
-            session_df = df[df["session_id"].astype(str) == session_id]
-            reason = classify_loss_reason(session_df)
-            records.append({"session_id": session_id, "reason": reason})
-
-        if records:
-            reasons_df = pd.DataFrame.from_records(records)
-            agg_df = reasons_df.groupby("reason", as_index=False).size().rename(columns={"size": "count"})
-
-            # Hoverable pie chart
-            fig = px.pie(agg_df, values="count", names="reason", title="What stopped shoppers from completing checkout")
-            fig.update_traces(textfont_color="black")
-            st.plotly_chart(fig)
-
-            # Selectable menu to explore a reason (including "No error") like in details page
-            all_reasons_sorted = agg_df.sort_values("count", ascending=False)
-            st.subheader("Explore a specific reason")
-            if not all_reasons_sorted.empty:
-                error_options = all_reasons_sorted["reason"].tolist()
-                chosen_error = st.selectbox("Which reason do you want to inspect?", error_options, key="insights_error_select")
-                if chosen_error:
-                    st.divider()
-                    # Sessions that match this error
-                    matching_sessions = set(reasons_df[reasons_df["reason"] == chosen_error]["session_id"].astype(str))
-                    total_matching = len(matching_sessions)
-                    st.metric("Sessions with this reason", total_matching)
-
-                    if total_matching > 0:
-                        # Always show navigation and a single events table by default
-                        key_base = f"insights_{chosen_error.replace(' ', '_').lower()}"
-                        index_key = f"{key_base}_idx"
-                        if index_key not in st.session_state:
-                            st.session_state[index_key] = 0
-
-                        ordered_sessions = sorted(list(matching_sessions))
-                        total_sessions = len(ordered_sessions)
-                        if total_sessions == 0:
-                            st.info("No sessions to show.")
-                        else:
-                            nav_cols = st.columns([1, 4, 1])
-                            with nav_cols[0]:
-                                if st.button("←", key=f"prev_{key_base}"):
-                                    st.session_state[index_key] = (st.session_state[index_key] - 1) % total_sessions
-                            with nav_cols[2]:
-                                if st.button("→", key=f"next_{key_base}"):
-                                    st.session_state[index_key] = (st.session_state[index_key] + 1) % total_sessions
-
-                            current_idx = st.session_state[index_key] % total_sessions
-                            current_session_id = ordered_sessions[current_idx]
-                            with nav_cols[1]:
-                                st.markdown(f"**Session {current_idx + 1} of {total_sessions}** — `{current_session_id}`")
-
-                            session_events = df[df["session_id"].astype(str) == current_session_id]
-                            st.dataframe(
-                                session_events[["path", "css", "text", "value", "event_time"]].head(50),
-                            )
-            else:
-                st.write("No errors detected among non-converting sessions.")
-        else:
-            st.info("No non-converting sessions found from product views.")
+        _render_insights(df, df_key, session_index)
 
 
 
@@ -1,10 +1,12 @@
 import pandas as pd
 
+from dashboard import _load_sessions_frame
+
 
 # Utils
 def count_unique_sessions(user_df: pd.DataFrame) -> int:
     """Count unique session_id values in a user dataframe."""
-    return len(set(user_df['session_id']))
+    return user_df['session_id'].nunique()
 
 
 def has_multiple_sessions(user_df: pd.DataFrame) -> bool:
@@ -23,16 +25,17 @@ def partition(iterable, condition) -> tuple[list, list]:
     return true_list, false_list
 
 
-def group_by_unique_column(df: pd.DataFrame, column_name: str) -> list[pd.DataFrame]:
-    """Return list of dataframes, one per unique value in column_name (sorted)."""
+def iter_groups(df: pd.DataFrame, column_name: str):
+    """Yield one dataframe per unique value in column_name (sorted).
+
+    Lazy: groups are produced on demand as views, without materializing a
+    list of N copied frames up front.
+    """
     if column_name not in df.columns:
         raise KeyError(f"Column '{column_name}' not found in dataframe")
 
-    column_groups: list[pd.DataFrame] = []
-    for _, group in df.groupby(column_name, sort=True, dropna=False):
-        column_groups.append(group.reset_index(drop=True))
-
-    return column_groups
+    for _, group in df.groupby(column_name, sort=True, dropna=False, observed=True):
+        yield group
 
 
 # Displaying data
@@ -48,19 +51,17 @@ def print_user_session(user_df: pd.DataFrame) -> None:
 
 
 def main():
-    df = pd.read_json('sessions.json', lines=True)
-    user_groups = group_by_unique_column(df, 'user_id')
-    print(f"Number of users: {len(user_groups)}")
+    df = _load_sessions_frame('sessions.json')
+    print(f"Number of users: {df['user_id'].nunique()}")
     print()
 
-    users_with_multiple_sessions, users_with_single_session = partition(user_groups, has_multiple_sessions)
+    users_with_multiple_sessions, users_with_single_session = partition(iter_groups(df, 'user_id'), has_multiple_sessions)
     print(f"Number of users with multiple sessions: {len(users_with_multiple_sessions)}")
     print(f"Number of users with single session: {len(users_with_single_session)}")
     print()
 
     for user_df in users_with_multiple_sessions[0:1]:
-        sessions = group_by_unique_column(user_df, 'session_id')
-        for session in sessions:
+        for session in iter_groups(user_df, 'session_id'):
             print_user_session(session)
 
 